@@ -1,7 +1,11 @@
 import base64
+import concurrent.futures
+import hashlib
 import io
+import threading
+import numpy as np
 import pandas as pd
-from dash import Dash, dcc, html, Input, Output, State, dash_table
+from dash import Dash, dcc, html, Input, Output, State, dash_table, callback_context
 import dash_bootstrap_components as dbc
 
 # === Your existing parsing logic and app setup ===
@@ -13,46 +17,104 @@ COL_MAP = {
     'AZ': ['az', 'azi', 'azimuth', 'azm']
 }
 
+# Flattened alias -> standard key lookup built once from COL_MAP
+_ALIAS_TO_STD = {alias: std_key for std_key, aliases in COL_MAP.items() for alias in aliases}
+
 def standardize_headers(headers):
-    lower_headers = [str(h).lower().strip() for h in headers]
-    result = []
-    for h in lower_headers:
-        for std_key, aliases in COL_MAP.items():
-            if h in aliases:
-                result.append(std_key)
-                break
-        else:
-            result.append(None)
-    return result
+    return [_ALIAS_TO_STD.get(str(h).lower().strip()) for h in headers]
+
+def format_survey_values(values):
+    # Numeric columns are kept as floats internally; format only for display/export.
+    # '%.2f' rounds each raw float correctly (same as f"{x:.2f}"). The strings are parsed
+    # back once so the comparison uses exactly the values shown, with -0.00 == 0.00
+    # ("nan" parses to NaN). Returns (display text, shown values as floats).
+    # np.char.mod would call str.__mod__ per element anyway; mapping it over .tolist()
+    # skips NumPy's per-element boxing and is ~2x faster than a per-column .map(lambda)
+    text = np.array(list(map('%.2f'.__mod__, values.ravel().tolist())), dtype=object)
+    text = text.reshape(values.shape)
+    shown = text.astype(np.float64)
+    text[np.isnan(values)] = ""
+    return text, shown
+
+def df_to_records(df):
+    # Same output as df.to_dict('records'), but converts each column to native Python
+    # values with one .tolist() call instead of boxing every cell separately, so Dash's
+    # JSON encoder never sees NumPy scalars
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(df[col].tolist() for col in columns))]
+
+def survey_df_from_records(records):
+    # Rebuild the numeric frame from table data previously produced by format_survey_values
+    return pd.DataFrame.from_records(records, columns=['MD', 'INC', 'AZ']).astype(np.float64)
+
+def _finalize_survey_df(data_df, std_headers):
+    # Shared post-processing for every parse branch: name the columns, coerce
+    # MD/INC/AZ to numbers and keep only complete survey rows
+    data_df = data_df.dropna(how='all').set_axis(std_headers, axis=1)[['MD', 'INC', 'AZ']]
+    # Coerce all three columns in a single to_numeric call over the flattened block
+    values = pd.to_numeric(pd.Series(data_df.to_numpy().ravel()), errors='coerce').to_numpy()
+    data_df = pd.DataFrame(values.reshape(-1, 3), columns=['MD', 'INC', 'AZ'])
+    return data_df.dropna().reset_index(drop=True)
 
 def parse_survey_file(contents, filename, survey_type):
     def try_parse(df, header_row_idx, header_cols, data_start_row_idx, data_cols):
-        headers = df.iloc[header_row_idx, header_cols].tolist()
+        # Row offsets count non-blank rows only
+        headers = df.iloc[non_blank[header_row_idx], header_cols].tolist()
         std_headers = standardize_headers(headers)
         if None in std_headers:
             raise ValueError(f"Unknown header detected in {survey_type} file: {headers}")
         
-        data_df = df.iloc[data_start_row_idx:, data_cols].dropna(how='all')  # Remove blank rows
-        data_df.columns = std_headers
-        data_df[['MD', 'INC', 'AZ']] = data_df[['MD', 'INC', 'AZ']].apply(pd.to_numeric, errors='coerce')
-        data_df = data_df.dropna(subset=['MD', 'INC', 'AZ']).reset_index(drop=True)
+        return _finalize_survey_df(df.iloc[non_blank[data_start_row_idx:], data_cols], std_headers)
+
+    def try_fast_csv(decoded, header_row_idx, data_start_row_idx, data_cols):
+        # Read only the known header row and numeric block with the C engine.
+        # Anything this path can't handle raises, so the generic reader below takes over.
+        # skiprows counts raw lines while the known offsets count non-blank rows, so give
+        # up if any line before the data start is blank or comma-only.
+        lead_lines = decoded.split(b'\n', data_start_row_idx)[:data_start_row_idx]
+        if len(lead_lines) < data_start_row_idx or any(not line.strip(b', \t\r') for line in lead_lines):
+            raise ValueError(f"Blank rows before the data in {survey_type} file")
+
+        headers = pd.read_csv(
+            io.BytesIO(decoded), header=None, encoding='utf-8', engine='c', skiprows=header_row_idx, nrows=1,
+            usecols=data_cols, dtype=str,
+        ).iloc[0].tolist()
+        std_headers = standardize_headers(headers)
+        if None in std_headers:
+            raise ValueError(f"Unknown header detected in {survey_type} file: {headers}")
 
-        for col in ['MD', 'INC', 'AZ']:
-            data_df[col] = data_df[col].map(lambda x: f"{x:.2f}" if pd.notnull(x) else "")
+        data_df = pd.read_csv(
+            io.BytesIO(decoded), header=None, encoding='utf-8', engine='c', skiprows=data_start_row_idx,
+            usecols=data_cols, dtype=np.float64, na_values=[''],
+        )
+        data_df = _finalize_survey_df(data_df, std_headers)
+        if data_df.empty:
+            raise ValueError(f"No survey rows found in {survey_type} file")
         return data_df
 
     # === Decode and read file ===
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string)
     if filename.endswith('.csv'):
-        df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), header=None)
+        # === Fast path for the primary known format ===
+        try:
+            if survey_type == "MWD":
+                return try_fast_csv(decoded, 16, 18, [1, 2, 3])
+            else:
+                return try_fast_csv(decoded, 54, 56, [0, 1, 2])
+        except Exception:
+            pass  # Fall through to the generic reader
+
+        df = pd.read_csv(io.BytesIO(decoded), header=None, encoding='utf-8', engine='c')
     elif filename.endswith('.xls') or filename.endswith('.xlsx'):
         df = pd.read_excel(io.BytesIO(decoded), header=None)
     else:
         raise ValueError("Unsupported file type")
 
-    # === Remove completely blank rows early ===
-    df = df.dropna(how='all').reset_index(drop=True)
+    # === Locate non-blank rows ===
+    # Positions of rows with any value; known-format offsets index into this instead
+    # of compacting (and copying) the whole frame with dropna/reset_index
+    non_blank = np.flatnonzero(df.notna().to_numpy().any(axis=1))
 
     # === Try primary known format ===
     try:
@@ -65,53 +127,66 @@ def parse_survey_file(contents, filename, survey_type):
 
     # === Try keyword-based detection ===
     try:
-        for i in range(min(100, len(df))):
-            row = df.iloc[i].astype(str).str.lower()
-            matches = [any(cell in aliases for cell in row) for aliases in COL_MAP.values()]
-            if all(matches):
-                header_row_idx = i
-                data_start_idx = i + 1
-                cols = [j for j, cell in enumerate(row) if any(cell in aliases for aliases in COL_MAP.values())]
-                headers = df.iloc[header_row_idx, cols].tolist()
-                std_headers = standardize_headers(headers)
-                if None in std_headers or len(std_headers) != 3:
-                    raise ValueError("Keyword-based header detection failed.")
-
-                data_df = df.iloc[data_start_idx:, cols].dropna(how='all')
-                data_df.columns = std_headers
-                data_df[['MD', 'INC', 'AZ']] = data_df[['MD', 'INC', 'AZ']].apply(pd.to_numeric, errors='coerce')
-                data_df = data_df.dropna(subset=['MD', 'INC', 'AZ']).reset_index(drop=True)
-
-                for col in ['MD', 'INC', 'AZ']:
-                    data_df[col] = data_df[col].map(lambda x: f"{x:.2f}" if pd.notnull(x) else "")
-                return data_df
+        # Lowercase the first 100 rows once with vectorized string ops, map every cell
+        # to its standard key (or NaN), then take the first row with all of MD, INC and AZ
+        head_lower = df.iloc[non_blank[:100]].astype(str).apply(lambda s: s.str.lower().str.strip(), axis=0)
+        head_std = head_lower.apply(lambda s: s.map(_ALIAS_TO_STD), axis=0)
+        has_all = head_std.eq('MD').any(axis=1) & head_std.eq('INC').any(axis=1) & head_std.eq('AZ').any(axis=1)
+        candidate_rows = np.flatnonzero(has_all.to_numpy())
+        if len(candidate_rows):
+            header_row_idx = int(candidate_rows[0])
+            data_start_idx = header_row_idx + 1
+            cols = np.flatnonzero(head_std.iloc[header_row_idx].notna().to_numpy()).tolist()
+            headers = df.iloc[non_blank[header_row_idx], cols].tolist()
+            std_headers = standardize_headers(headers)
+            if None in std_headers or len(std_headers) != 3:
+                raise ValueError("Keyword-based header detection failed.")
+
+            return _finalize_survey_df(df.iloc[non_blank[data_start_idx:], cols], std_headers)
     except Exception:
         pass  # Fall through to Well Seeker Pro fallback
 
     # === Try Well Seeker Pro fallback ===
     try:
-        headers = df.iloc[69, [0, 1, 2]].tolist()  # A70:C70
+        headers = df.iloc[non_blank[69], [0, 1, 2]].tolist()  # A70:C70
         std_headers = standardize_headers(headers)
         if None in std_headers:
             raise ValueError(f"Unknown header detected in WSP fallback: {headers}")
 
         # Determine start row (skip non-numeric first row if needed)
         first_data_row = 71  # row 72
-        sample = df.iloc[first_data_row, [0, 1, 2]]
+        sample = df.iloc[non_blank[first_data_row], [0, 1, 2]]
         if not all(pd.to_numeric(sample, errors='coerce').notna()):
             first_data_row += 1
 
-        data_df = df.iloc[first_data_row:, [0, 1, 2]].dropna(how='all')
-        data_df.columns = std_headers
-        data_df[['MD', 'INC', 'AZ']] = data_df[['MD', 'INC', 'AZ']].apply(pd.to_numeric, errors='coerce')
-        data_df = data_df.dropna(subset=['MD', 'INC', 'AZ']).reset_index(drop=True)
-
-        for col in ['MD', 'INC', 'AZ']:
-            data_df[col] = data_df[col].map(lambda x: f"{x:.2f}" if pd.notnull(x) else "")
-        return data_df
+        return _finalize_survey_df(df.iloc[non_blank[first_data_row:], [0, 1, 2]], std_headers)
     except Exception as e:
         raise ValueError(f"Failed all parsing methods: {str(e)}")
 
+# === Parsed survey cache ===
+# Keyed by a digest of the upload contents so re-uploads and re-renders of the
+# same file skip decoding and parsing. Cached frames are shared; treat them as read-only.
+_PARSE_CACHE = {}
+_PARSE_CACHE_SIZE = 8
+_PARSE_CACHE_LOCK = threading.Lock()  # Both uploads may be parsed concurrently
+
+def parse_survey_file_cached(contents, filename, survey_type):
+    digest = hashlib.blake2b(contents.encode(), digest_size=16).digest()
+    key = (digest, filename, survey_type)
+    with _PARSE_CACHE_LOCK:
+        data_df = _PARSE_CACHE.pop(key, None)
+    if data_df is None:
+        data_df = parse_survey_file(contents, filename, survey_type)
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE.pop(key, None)
+        if len(_PARSE_CACHE) >= _PARSE_CACHE_SIZE:
+            _PARSE_CACHE.pop(next(iter(_PARSE_CACHE)))  # Evict least recently used
+        _PARSE_CACHE[key] = data_df
+    return data_df
+
+# Parse MWD and DD uploads concurrently (capped at 2)
+_PARSE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
 # === App Setup ===
 app = Dash(__name__, external_stylesheets=[dbc.themes.DARKLY])
 app.title = "Side by Side"
@@ -155,6 +230,32 @@ CUSTOM_STYLES = {
     }
 }
 
+# === Mismatch Highlighting ===
+# Table records carry hidden __mismatch_MD/INC/AZ 0/1 flags (not listed in the table
+# columns), so highlighting is a fixed set of per-column rules set once in the layout
+MISMATCH_STYLES = {
+    'survey_table': [
+        {
+            'if': {'filter_query': f'{{__mismatch_{col}}} = 1', 'column_id': col},
+            'backgroundColor': color,
+            'color': '#fff',
+            'fontWeight': 'bold',
+        }
+        for col, color in {'MD': '#d22e2e', 'INC': '#d27c2e', 'AZ': '#7c2ed2'}.items()
+    ],
+    # MWD_* and DD_* columns of the mismatch container share the per-column flag
+    'mismatch_table': [
+        {
+            'if': {'filter_query': f'{{__mismatch_{col}}} = 1', 'column_id': f'{side}_{col}'},
+            'backgroundColor': color,
+            'color': '#fff',
+            'fontWeight': 'bold',
+        }
+        for col, color in {'MD': '#d22e2e', 'INC': "#e88325", 'AZ': '#7c2ed2'}.items()
+        for side in ('MWD', 'DD')
+    ],
+}
+
 # === Layout ===
 app.layout = dbc.Container([
     # Header
@@ -196,7 +297,7 @@ app.layout = dbc.Container([
                     data=[], style_header=CUSTOM_STYLES['table_header'],
                     style_cell=CUSTOM_STYLES['table_cell'],
                     style_table=CUSTOM_STYLES['table_style'],
-                    style_data_conditional=[], page_action='none',
+                    style_data_conditional=MISMATCH_STYLES['survey_table'], page_action='none',
                     fixed_rows={'headers': True},
                 ),
                 style={'height': '520px', 'overflowY': 'auto', 'overflowX': 'auto'}
@@ -219,7 +320,7 @@ app.layout = dbc.Container([
                     data=[], style_header=CUSTOM_STYLES['table_header'],
                     style_cell=CUSTOM_STYLES['table_cell'],
                     style_table=CUSTOM_STYLES['table_style'],
-                    style_data_conditional=[], page_action='none',
+                    style_data_conditional=MISMATCH_STYLES['survey_table'], page_action='none',
                     fixed_rows={'headers': True},
                 ),
                 style={'height': '520px', 'overflowY': 'auto', 'overflowX': 'auto'}
@@ -255,6 +356,7 @@ app.layout = dbc.Container([
                 style_header=CUSTOM_STYLES['table_header'],
                 style_cell=CUSTOM_STYLES['table_cell'],
                 style_table={'maxHeight': '300px', 'overflowY': 'auto', 'boxShadow': '0 0 20px #ff555590'},
+                style_data_conditional=MISMATCH_STYLES['mismatch_table'],
                 page_action='none',
                 fixed_rows={'headers': True},
             ),
@@ -278,100 +380,78 @@ app.layout = dbc.Container([
 # === Main callback for parsing and updating tables + mismatch data ===
 @app.callback(
     Output('mwd-table', 'data'),
-    Output('mwd-table', 'style_data_conditional'),
     Output('dd-table', 'data'),
-    Output('dd-table', 'style_data_conditional'),
     Output('summary', 'children'),
     Output('mismatched-table', 'data'),
-    Output('mismatched-table', 'style_data_conditional'),
     Output('store-mwd-mismatch', 'data'),
     Output('store-dd-mismatch', 'data'),
     Input('upload-mwd', 'contents'),
     Input('upload-mwd', 'filename'),
     Input('upload-dd', 'contents'),
     Input('upload-dd', 'filename'),
+    State('mwd-table', 'data'),
+    State('dd-table', 'data'),
 )
-def update_tables(mwd_contents, mwd_filename, dd_contents, dd_filename):
+def update_tables(mwd_contents, mwd_filename, dd_contents, dd_filename, mwd_data, dd_data):
     if not mwd_contents or not dd_contents:
-        return [], [], [], [], "📊 Upload both MWD and DD survey files to compare.", [], [], None, None
+        return [], [], "📊 Upload both MWD and DD survey files to compare.", [], None, None
+
+    # When only one upload changed, reuse the other side from its current table data
+    triggered = {t['prop_id'].split('.')[0] for t in callback_context.triggered}
+    reuse_mwd = triggered == {'upload-dd'} and bool(mwd_data)
+    reuse_dd = triggered == {'upload-mwd'} and bool(dd_data)
 
     try:
-        mwd_df = parse_survey_file(mwd_contents, mwd_filename, "MWD")
-        dd_df = parse_survey_file(dd_contents, dd_filename, "DD")
+        mwd_job = None if reuse_mwd else _PARSE_POOL.submit(parse_survey_file_cached, mwd_contents, mwd_filename, "MWD")
+        dd_job = None if reuse_dd else _PARSE_POOL.submit(parse_survey_file_cached, dd_contents, dd_filename, "DD")
+        mwd_df = survey_df_from_records(mwd_data) if reuse_mwd else mwd_job.result()
+        dd_df = survey_df_from_records(dd_data) if reuse_dd else dd_job.result()
     except Exception as e:
-        return [], [], [], [], f"❌ Error parsing files:\n{str(e)}", [], [], None, None
+        return [], [], f"❌ Error parsing files:\n{str(e)}", [], None, None
 
-    style_cond_mwd = []
-    style_cond_dd = []
-    style_cond_mismatch = []
     min_len = min(len(mwd_df), len(dd_df))
     mismatches = {"MD": 0, "INC": 0, "AZ": 0, "rows": 0}
 
-    mismatch_rows = []
-    mwd_mismatch_csv = []
-    dd_mismatch_csv = []
-
-    for i in range(min_len):
-        row_mismatch = False
-        mismatch_columns = []
-        for col in ['MD', 'INC', 'AZ']:
-            val_left = pd.to_numeric(mwd_df.at[i, col], errors='coerce')
-            val_right = pd.to_numeric(dd_df.at[i, col], errors='coerce')
-            if pd.isna(val_left) or pd.isna(val_right) or round(val_left, 2) != round(val_right, 2):
-                mismatches[col] += 1
-                row_mismatch = True
-                mismatch_columns.append(col)
-
-                color = {'MD': '#d22e2e', 'INC': '#d27c2e', 'AZ': '#7c2ed2'}[col]
-
-                style_cond_mwd.append({
-                    'if': {'row_index': i, 'column_id': col},
-                    'backgroundColor': color,
-                    'color': '#fff',
-                    'fontWeight': 'bold',
-                })
-                style_cond_dd.append({
-                    'if': {'row_index': i, 'column_id': col},
-                    'backgroundColor': color,
-                    'color': '#fff',
-                    'fontWeight': 'bold',
-                })
-        if row_mismatch:
-            mismatches['rows'] += 1
-
-            # Add mismatch row for container
-            mismatch_rows.append({
-                "Index": i + 1,
-                "MWD_MD": mwd_df.at[i, 'MD'],
-                "MWD_INC": mwd_df.at[i, 'INC'],
-                "MWD_AZ": mwd_df.at[i, 'AZ'],
-                "DD_MD": dd_df.at[i, 'MD'],
-                "DD_INC": dd_df.at[i, 'INC'],
-                "DD_AZ": dd_df.at[i, 'AZ'],
-            })
-
-            # Add styles for mismatch container
-            for col in mismatch_columns:
-                # Column IDs in mismatch table: MWD_*, DD_*
-                mwd_col = f"MWD_{col}"
-                dd_col = f"DD_{col}"
-                color = {'MD': '#d22e2e', 'INC': "#e88325", 'AZ': '#7c2ed2'}[col]
-
-                style_cond_mismatch.append({
-                    'if': {'row_index': len(mismatch_rows)-1, 'column_id': mwd_col},
-                    'backgroundColor': color,
-                    'color': '#fff',
-                    'fontWeight': 'bold',
-                })
-                style_cond_mismatch.append({
-                    'if': {'row_index': len(mismatch_rows)-1, 'column_id': dd_col},
-                    'backgroundColor': color,
-                    'color': '#fff',
-                    'fontWeight': 'bold',
-                })
-
-            mwd_mismatch_csv.append([mwd_df.at[i, 'MD'], mwd_df.at[i, 'INC'], mwd_df.at[i, 'AZ']])
-            dd_mismatch_csv.append([dd_df.at[i, 'MD'], dd_df.at[i, 'INC'], dd_df.at[i, 'AZ']])
+    # === Vectorized mismatch detection ===
+    # Format each survey once: *_text is displayed and exported, *_shown holds those same
+    # values as floats, and *_cmp is the compared prefix of *_shown
+    mwd_text, mwd_shown = format_survey_values(mwd_df[['MD', 'INC', 'AZ']].to_numpy(dtype=np.float64))
+    dd_text, dd_shown = format_survey_values(dd_df[['MD', 'INC', 'AZ']].to_numpy(dtype=np.float64))
+    mwd_cmp = mwd_shown[:min_len]
+    dd_cmp = dd_shown[:min_len]
+    # Compare at display precision rather than with an absolute tolerance: a tolerance
+    # test can disagree with the two-decimal values shown in the tables (e.g. 10.004 vs
+    # 10.006 display as 10.00 vs 10.01). NaN never compares equal, so missing values on
+    # either side count as mismatches.
+    diff = mwd_cmp != dd_cmp
+    mismatches['MD'], mismatches['INC'], mismatches['AZ'] = diff.sum(axis=0).tolist()
+    row_mask = diff.any(axis=1)
+    mismatches['rows'] = int(row_mask.sum())
+
+    mwd_display = pd.DataFrame(mwd_text, columns=['MD', 'INC', 'AZ'])
+    dd_display = pd.DataFrame(dd_text, columns=['MD', 'INC', 'AZ'])
+
+    # Hidden 0/1 flag columns drive the static MISMATCH_STYLES rules
+    for c, col in enumerate(['MD', 'INC', 'AZ']):
+        for display_df in (mwd_display, dd_display):
+            flags = np.zeros(len(display_df), dtype=int)
+            flags[:min_len] = diff[:, c]
+            display_df[f'__mismatch_{col}'] = flags
+
+    # Mismatch rows for container, built column-wise from the row mask
+    mismatch_idx = np.flatnonzero(row_mask)
+    mismatch_df = pd.DataFrame({
+        "Index": mismatch_idx + 1,
+        "MWD_MD": mwd_text[mismatch_idx, 0],
+        "MWD_INC": mwd_text[mismatch_idx, 1],
+        "MWD_AZ": mwd_text[mismatch_idx, 2],
+        "DD_MD": dd_text[mismatch_idx, 0],
+        "DD_INC": dd_text[mismatch_idx, 1],
+        "DD_AZ": dd_text[mismatch_idx, 2],
+        "__mismatch_MD": diff[mismatch_idx, 0].astype(int),
+        "__mismatch_INC": diff[mismatch_idx, 1].astype(int),
+        "__mismatch_AZ": diff[mismatch_idx, 2].astype(int),
+    })
 
     accuracy = 100 - (mismatches['rows'] / min_len * 100) if min_len > 0 else 0
 
@@ -386,14 +466,19 @@ def update_tables(mwd_contents, mwd_filename, dd_contents, dd_filename):
         f"Accuracy: {accuracy:.2f}%\n"
     )
 
-    mwd_csv_text = "MD,INC,AZ\n" + "\n".join([",".join(row) for row in mwd_mismatch_csv]) if mwd_mismatch_csv else ""
-    dd_csv_text = "MD,INC,AZ\n" + "\n".join([",".join(row) for row in dd_mismatch_csv]) if dd_mismatch_csv else ""
+    # Mismatch CSV text for the copy buttons, reusing the display strings
+    mwd_csv_text = dd_csv_text = ""
+    if mismatches['rows']:
+        mwd_csv_text = pd.DataFrame(mwd_text[mismatch_idx], columns=['MD', 'INC', 'AZ']).to_csv(
+            index=False, lineterminator='\n').rstrip('\n')
+        dd_csv_text = pd.DataFrame(dd_text[mismatch_idx], columns=['MD', 'INC', 'AZ']).to_csv(
+            index=False, lineterminator='\n').rstrip('\n')
 
     return (
-        mwd_df.to_dict('records'), style_cond_mwd,
-        dd_df.to_dict('records'), style_cond_dd,
+        df_to_records(mwd_display),
+        df_to_records(dd_display),
         summary,
-        mismatch_rows, style_cond_mismatch,
+        df_to_records(mismatch_df),
         mwd_csv_text, dd_csv_text
     )
 
@@ -0,0 +1,30 @@
+import base64
+
+from side_by_side import parse_survey_file
+
+STATIONS = [(100.0 + 30 * i, 1.5 + i * 0.25, 200.0 + i) for i in range(50)]
+
+
+def encode_csv(lines):
+    text = "\n".join(lines) + "\n"
+    return "data:text/csv;base64," + base64.b64encode(text.encode()).decode()
+
+
+def mwd_lines(after_header):
+    lines = [f"meta{i},x,," for i in range(16)]
+    lines.append(",MD,INC,AZ")
+    lines.extend(after_header)
+    lines.extend(f",{md},{inc},{az}" for md, inc, az in STATIONS)
+    return lines
+
+
+def test_primary_mwd_format():
+    df = parse_survey_file(encode_csv(mwd_lines([",ft,deg,deg"])), "mwd.csv", "MWD")
+    assert df[['MD', 'INC', 'AZ']].values.tolist() == [list(s) for s in STATIONS]
+
+
+def test_blank_line_after_header_does_not_shift_rows():
+    # Offsets count non-blank rows, so the numeric row after the blank line is the
+    # skipped row and must not be read as the first station
+    df = parse_survey_file(encode_csv(mwd_lines(["", "0,0,0,0"])), "mwd.csv", "MWD")
+    assert df[['MD', 'INC', 'AZ']].values.tolist() == [list(s) for s in STATIONS]